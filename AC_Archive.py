@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#MIT License
+#
+#Copyright (c) 2021 TheHWcave
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#
+
+#
+#	Long term archive for PZEM measurements 
+#
+#	The archive is a directory with two files per meter: 
+#		<meter>.dat	compressed chunks, appended one after the other
+#		<meter>.idx	one 32 byte record per chunk: first and last time, 
+#					offset and length in the .dat file, number of samples
+#	and imported.txt, which lists the CSV files already imported per meter.
+#
+#	A chunk holds the samples of one meter for one CHUNK_SEC time window.
+#	All values are stored as integers (see ASCALE), column by column and
+#	delta encoded, so that zlib can squeeze out the slowly changing data.
+#	A time range query only reads and decompresses the chunks whose 
+#	time bounds overlap the range.
+#
+import os
+import re
+import sys
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import accumulate
+from time import mktime,strptime,localtime,strftime
+
+CHUNK_SEC = 3600		# time window of a chunk 
+CHUNK_MS  = CHUNK_SEC*1000
+
+Sample = namedtuple('Sample',['Time','Volt','Current','Power',
+							  'Energy','Freq','Pf','Alarm'])
+							  
+# resolution of the stored integers, in Sample order. The time is in ms. 
+# Finer than the module registers, so averaged values and x10 recordings
+# keep their extra digits 
+ASCALE = (0.001,0.01,0.0001,0.01,0.1,0.01,0.001,1)
+
+_IDX = struct.Struct('<qqQII')		# t_first,t_last (ms), offset, length, count
+_CNT = struct.Struct('<I')			# number of samples at the start of a chunk
+
+_METER_OK = re.compile(r'^[A-Za-z0-9_.@-]+$')
+
+# header labels used in REC_*.csv (GUI) and ACM_*.csv (CLI) files
+_CSV_LABELS = {'Volt':'Volt','Curr':'Current','Current':'Current',
+			   'Pwr':'Power','Power':'Power','Ener':'Energy','Energy':'Energy',
+			   'Freq':'Freq','Pf':'Pf','PF':'Pf','Alarm':'Alarm'}
+
+
+def _encode(rows):
+	"""
+		rows is a list of integer tuples in Sample order. Returns the
+		compressed chunk
+	"""
+	n = len(rows)
+	a = array('q')
+	for col in zip(*rows):
+		prev = 0
+		for v in col:
+			a.append(v-prev)
+			prev = v
+	if sys.byteorder == 'big':
+		a.byteswap()
+	return zlib.compress(_CNT.pack(n)+a.tobytes(),6)
+
+
+def _decode(blob):
+	"""
+		reverses _encode and returns the list of integer columns
+	"""
+	raw = zlib.decompress(blob)
+	n = _CNT.unpack_from(raw)[0]
+	a = array('q')
+	a.frombytes(raw[_CNT.size:])
+	if sys.byteorder == 'big':
+		a.byteswap()
+	return [list(accumulate(a[i*n:(i+1)*n])) for i in range(len(Sample._fields))]
+
+
+class Archive:
+	
+	def __init__(self,Path):
+		"""
+			opens (and if needed creates) the archive directory Path
+		"""
+		self.Path = Path
+		os.makedirs(Path,exist_ok=True)
+		self.__buf = {}		# meter -> (chunk number, list of integer rows)
+		self.__idx = {}		# meter -> (.idx file size, list of t_first, list of index records)
+		
+	def __file(self,Meter,ext):
+		if not _METER_OK.match(Meter):
+			raise ValueError('bad meter name: '+Meter)
+		return os.path.join(self.Path,Meter+ext)
+	
+	def __index(self,Meter):
+		"""
+			returns the index of a meter as (list of t_first, list of 
+			records), sorted by t_first. It is cached and read again when
+			the .idx file size changes, so chunks appended by __flush or
+			by another process (a running logger ..) are seen
+		"""
+		fn = self.__file(Meter,'.idx')
+		size = os.path.getsize(fn) if os.path.exists(fn) else 0
+		if (Meter not in self.__idx) or (self.__idx[Meter][0] != size):
+			recs = []
+			if size > 0:
+				with open(fn,'rb') as f:
+					data = f.read()
+				size = len(data)
+				# ignore a partial record left by a crash while writing
+				data = data[:len(data)-len(data) % _IDX.size]
+				recs = list(_IDX.iter_unpack(data))
+				recs.sort()
+			self.__idx[Meter] = (size,[r[0] for r in recs],recs)
+		return self.__idx[Meter][1:]
+	
+	def __flush(self,Meter):
+		"""
+			writes the buffered samples of a meter as one chunk
+		"""
+		chunk,rows = self.__buf.pop(Meter,(None,[]))
+		if len(rows) > 0:
+			blob = _encode(rows)
+			t = [r[0] for r in rows]
+			with open(self.__file(Meter,'.dat'),'ab') as f:
+				offset = f.tell()
+				f.write(blob)
+			rec = (min(t),max(t),offset,len(blob),len(rows))
+			with open(self.__file(Meter,'.idx'),'ab') as f:
+				rem = f.tell() % _IDX.size
+				if rem != 0:
+					f.truncate(f.tell()-rem)	# partial record from a crash
+				f.write(_IDX.pack(*rec))
+	
+	def Meters(self):
+		"""
+			returns the names of all meters in the archive
+		"""
+		return sorted(fn[:-4] for fn in os.listdir(self.Path) if fn.endswith('.idx'))
+	
+	def Append(self,Meter,Time,Volt,Current,Power,Energy,Freq,Pf,Alarm=0):
+		"""
+			adds one sample. Time is the unix time in seconds, the 
+			other values are in PollData units. Samples are buffered 
+			until their time window is complete or Flush() is called
+		"""
+		row = tuple(int(round(v/s)) for v,s in 
+					zip((Time,Volt,Current,Power,Energy,Freq,Pf,Alarm),ASCALE))
+		chunk = row[0]//CHUNK_MS
+		if (Meter in self.__buf) and (self.__buf[Meter][0] != chunk):
+			self.__flush(Meter)
+		if Meter not in self.__buf:
+			self.__file(Meter,'.dat')	# check the name before buffering
+			self.__buf[Meter] = (chunk,[])
+		self.__buf[Meter][1].append(row)
+	
+	def Store(self,Meter,Batch):
+		"""
+			adds all samples of a SampleBatch (see AC_COMBOX)
+		"""
+		cols = [Batch.Column(name) for name in Sample._fields]
+		for sample in zip(*cols):
+			self.Append(Meter,*sample)
+	
+	def Flush(self):
+		"""
+			writes all buffered samples
+		"""
+		for Meter in list(self.__buf):
+			self.__flush(Meter)
+	
+	def Close(self):
+		self.Flush()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self,*exc):
+		self.Close()
+	
+	def Query(self,Meter,Start,End):
+		"""
+			returns a list of Sample tuples of a meter with 
+			Start <= Time < End (unix times in seconds), sorted by time.
+			Samples not yet flushed are not included, chunks written by 
+			other processes are
+		"""
+		start = int(round(Start*1000.0))
+		end   = int(round(End*1000.0))
+		t_first,recs = self.__index(Meter)
+		# chunks never span more than CHUNK_MS, so only chunks starting
+		# in [start-CHUNK_MS,end) can overlap the range
+		lo = bisect_left(t_first,start-CHUNK_MS)
+		hi = bisect_left(t_first,end)
+		res = []
+		if lo < hi:
+			with open(self.__file(Meter,'.dat'),'rb') as f:
+				for t0,t1,offset,length,count in recs[lo:hi]:
+					if t1 < start:
+						continue
+					f.seek(offset)
+					cols = _decode(f.read(length))
+					for row in zip(*cols):
+						if start <= row[0] < end:
+							res.append(Sample(*[v*s for v,s in zip(row,ASCALE)]))
+		res.sort()
+		return res
+	
+	def ImportCSV(self,Meter,FileName,Start=None):
+		"""
+			imports a REC_*.csv (GUI) or ACM_*.csv (CLI) recording and 
+			returns the number of samples. The time column in these files 
+			is relative to the recording start, which is taken from the 
+			file name unless Start (unix time) is given. 
+			
+			A file that was already imported for the meter (same file 
+			name) raises ValueError, so samples are never stored twice. 
+			The whole file is read before anything is stored, lines with 
+			missing or non-numeric values (a recording cut off by a 
+			crash ..) are skipped
+		"""
+		done = os.path.join(self.Path,'imported.txt')
+		entry = Meter+'\t'+os.path.basename(FileName)
+		self.__file(Meter,'.dat')	# check the meter name
+		if os.path.exists(done):
+			with open(done,'r') as f:
+				if entry in f.read().splitlines():
+					raise ValueError('already imported')
+		if Start == None:
+			m = re.search(r'(\d{14})\.csv$',FileName)
+			if m == None:
+				raise ValueError('no start time in file name')
+			Start = mktime(strptime(m.group(1),'%Y%m%d%H%M%S'))
+		rows = []
+		# the GUI writes the header in the locale encoding (º), the 
+		# numbers are plain ASCII
+		with open(FileName,'r',encoding='latin-1') as f:
+			head = [h.split('[')[0].strip() for h in f.readline().split(',')]
+			pos  = {}
+			for i,h in enumerate(head):
+				if h in _CSV_LABELS:
+					pos[_CSV_LABELS[h]] = i
+			cols = [pos.get(fld) for fld in Sample._fields[1:]]
+			for line in f:
+				vals = line.split(',')
+				if len(vals) < len(head):
+					continue	# incomplete last line 
+				try:
+					rows.append([Start+float(vals[0])]+
+								[float(vals[c]) if c != None else 0.0 for c in cols])
+				except ValueError:
+					continue	# empty or damaged value
+		for row in rows:
+			self.Append(Meter,*row)
+		self.Flush()
+		with open(done,'a') as f:
+			f.write(entry+'\n')
+		return len(rows)
+
+
+def _parse_time(s):
+	"""
+		converts "YYYY-mm-dd HH:MM[:SS]" (local time) or unix seconds
+	"""
+	try:
+		return float(s)
+	except ValueError:
+		pass
+	for fmt in ('%Y-%m-%d %H:%M:%S','%Y-%m-%d %H:%M','%Y-%m-%d'):
+		try:
+			return mktime(strptime(s,fmt))
+		except ValueError:
+			pass
+	raise ValueError('bad time: '+s)
+
+
+if __name__ == "__main__":
+	import argparse
+	
+	parser = argparse.ArgumentParser()
+	parser.add_argument('archive',help='archive directory')
+	cmds = parser.add_subparsers(dest='cmd',metavar='command',required=True)
+	
+	cmd = cmds.add_parser('import',help='import REC_*.csv / ACM_*.csv recordings')
+	cmd.add_argument('--meter','-m',help='meter name',dest='meter',action='store',type=str,required=True)
+	cmd.add_argument('--start',help='recording start time, single file only (def=from file name)',
+						dest='start',action='store',type=_parse_time,default=None)
+	cmd.add_argument('files',help='csv files',nargs='+')
+	
+	cmd = cmds.add_parser('query',help='print the samples of a meter in a time range')
+	cmd.add_argument('--meter','-m',help='meter name',dest='meter',action='store',type=str,required=True)
+	cmd.add_argument('--from','-f',help='start, "YYYY-mm-dd HH:MM[:SS]" or unix time',
+						dest='start',action='store',type=_parse_time,required=True)
+	cmd.add_argument('--to','-t',help='end (exclusive), same format',
+						dest='end',action='store',type=_parse_time,required=True)
+	
+	cmds.add_parser('meters',help='list the meters in the archive')
+	
+	arg = parser.parse_args()
+	if (arg.cmd == 'import') and (arg.start != None) and (len(arg.files) > 1):
+		parser.error('--start can only be used with a single file')
+	
+	rc = 0
+	ARC = Archive(arg.archive)
+	if arg.cmd == 'import':
+		for fn in arg.files:
+			try:
+				n = ARC.ImportCSV(arg.meter,fn,arg.start)
+				print('{:s}: {:n} samples'.format(fn,n))
+			except (OSError,ValueError) as e:
+				# UnicodeDecodeError is a ValueError
+				print('{:s}: {}'.format(fn,e),file=sys.stderr)
+				rc = 1
+	elif arg.cmd == 'query':
+		print('Time,Volt[V],Current[A],Power[W],Energy[Wh],Freq[Hz],PF,Alarm')
+		for s in ARC.Query(arg.meter,arg.start,arg.end):
+			print('{:s}.{:03n},{:4.1f},{:7.4f},{:5.2f},{:5.1f},{:4.2f},{:5.3f},{:1n}'.format(
+				strftime('%Y-%m-%d %H:%M:%S',localtime(s.Time)),int(round(s.Time*1000))%1000,
+				*s[1:]))
+	elif arg.cmd == 'meters':
+		for m in ARC.Meters():
+			print(m)
+	sys.exit(rc)
@@ -24,29 +24,22 @@
 
 import serial
 import struct
-import argparse
+import sys
+from array import array
+from bisect import bisect_left
 from collections import namedtuple
 from time import sleep,time,localtime,strftime,perf_counter
 
-parser = argparse.ArgumentParser()
 DEFPORT = '/dev/accom_0'
+DEFADDR = 1
+DEFSCAN = '1-32'		# slave addresses probed by Discover()
+DEFTRIES = 50			# empty reads (of 10ms each) before a normal command times out
+PROBETRIES = 10			# empty reads (of 10ms each) before a probe gives up
 
-
-parser.add_argument('--port','-p',help='port (default ='+DEFPORT,
-					dest='port_dev',action='store',type=str,default=DEFPORT)
-parser.add_argument('--out','-o',help='output filename (default=ACCOM_<timestamp>.csv)',
-					dest='out_name',action='store',type=str,default='!')
-parser.add_argument('--time','-t',help='interval time in seconds between measurements (def=1.0)',
-					dest='int_time',action='store',type=float,default=1.0)
-
-					
-parser.add_argument('--reset','-r',help='reset energy ',
-					dest='reset',action='store_true')
-parser.add_argument('--alarm','-a',help='power alarm threshold [W] ',
-					dest='alarm',action='store',type=int,default=23000)
-					
-parser.add_argument('--debug','-d',help='debug level 0.. (def=1)',
-					dest='debug',action='store',type=int,default=0)
+# scale factors from raw register values to PollData units, in PollData order
+SCALE = (0.1,0.001,0.1,1.0,0.1,0.01,1)
+# decimal places of these resolutions, for rounding the scaled values 
+DIGITS = (1,3,1,0,1,2,0)
 
 
 class AC_COMBOX:
@@ -81,19 +74,16 @@ class AC_COMBOX:
 	#
 	# 	The class keeps copies of the actual values in the AC module here
 	#
-	__volt 		= 0.0	# in V
-	__current	= 0.0	# in A
-	__power		= 0.0	# in W
-	__energy	= 0.0	# in Wh
-	__freq		= 0.0	# in Hz
-	__pf		= 0.0	
-	__alarm		= 0
+	__raw		= None	# raw (U,I,P,E,F,PF,ALM) of the last Poll, alarm as 0/1
 	__thresh	= 0.0	# in W
 	__addr		= 0
 	
 	
 	PollData = namedtuple('PollData',['Volt','Current','Power',
 									  'Energy','Freq','Pf','Alarm'])
+	
+	__tries		= DEFTRIES
+	__quiet		= False
 									  
 									  
 	
@@ -101,10 +91,12 @@ class AC_COMBOX:
 		"""
 			prints a hex dump of the buffer on the terminal
 		"""
-		print(prompt,end='')
+		if self.__quiet:
+			return
+		print(prompt,end='',file=sys.stderr)
 		for b in buf:
-			print('{:02x} '.format(b),end='')
-		print()
+			print('{:02x} '.format(b),end='',file=sys.stderr)
+		print(file=sys.stderr)
 
 	def __CRC16(self,buf):
 		""" 
@@ -203,7 +195,7 @@ class AC_COMBOX:
 		buflen = 0
 		raw = bytearray
 		res = False
-		tries = 50
+		tries = self.__tries
 		while (tries > 0):
 			raw = self.__ACM.read(32)
 			if len(raw) > 0:
@@ -215,7 +207,8 @@ class AC_COMBOX:
 			else:
 				tries = tries - 1
 		if tries == 0:
-			print('timeout')
+			if not self.__quiet:
+				print('timeout',file=sys.stderr)
 		else:
 			#self.__dump('msg:',buf[:buflen])
 			data = buf[:buflen]
@@ -223,14 +216,15 @@ class AC_COMBOX:
 				if data[-2:] == self.__CRC16(data):
 					if data[1:3] == b'\x04\x14': 
 						# Expected response for read_regs of 10 registers starting with REG_U
+						# values are kept raw, scaling is done by Poll or SampleBatch
 						msg = struct.unpack('>3B11H',data)
-						self.__volt 	= float(msg[3+self.__REG_U])*0.1
-						self.__current 	= float((0x10000*msg[3+self.__REG_IH]+msg[3+self.__REG_IL]))*0.001
-						self.__power	= float((0x10000*msg[3+self.__REG_PH]+msg[3+self.__REG_PL]))*0.1
-						self.__energy	= float((0x10000*msg[3+self.__REG_EH]+msg[3+self.__REG_EL]))
-						self.__freq		= float(msg[3+self.__REG_F])*0.1
-						self.__pf		= float(msg[3+self.__REG_PF])*0.01
-						self.__alarm	= 1 if msg[3+self.__REG_ALM] == 0xffff else 0
+						self.__raw = (msg[3+self.__REG_U],
+									  0x10000*msg[3+self.__REG_IH]+msg[3+self.__REG_IL],
+									  0x10000*msg[3+self.__REG_PH]+msg[3+self.__REG_PL],
+									  0x10000*msg[3+self.__REG_EH]+msg[3+self.__REG_EL],
+									  msg[3+self.__REG_F],
+									  msg[3+self.__REG_PF],
+									  1 if msg[3+self.__REG_ALM] == 0xffff else 0)
 						res = True
 					elif data[1:3] == b'\x03\x04': 
 						# Expected response for read_regs of 2 registers starting with REG_TH
@@ -245,11 +239,11 @@ class AC_COMBOX:
 						#  [sa][06][  reg  ][  val ][crc16]
 						# 
 						msg = struct.unpack('>2B3H',data)
-						if msg[0] == self.__REG_TH	: 
-							self.__thresh = float(msg[2])
+						if msg[2] == self.__REG_TH	: 
+							self.__thresh = float(msg[3])
 							res = True
-						elif msg[0] == self.__REG_ADDR:
-							self.__addr = msg[2]
+						elif msg[2] == self.__REG_ADDR:
+							self.__addr = msg[3]
 							res = True
 						else: 
 							self.__dump('unknown valid response to 0x06 msg:',buf[:buflen])
@@ -267,22 +261,22 @@ class AC_COMBOX:
 				self.__dump('not enough data:',buf[:buflen])
 		return res
 		
-	def Poll(self):
+	def Poll(self,Batch = None):
 		"""
 			read data from the module and return it as a tuple
 			
+			If a SampleBatch is given, the raw register values are 
+			appended to it instead and True is returned. The new 
+			sample is Batch[-1]
 		"""
 		
 		pd = None
 		if self.__cmd_read_regs(self.__SLAVEADD,self.__FC_R_INP,self.__REG_U,10):
-			pd = self.PollData(
-						Volt 	= self.__volt,
-						Current = self.__current,
-						Power	= self.__power,
-						Energy	= self.__energy,
-						Freq	= self.__freq,
-						Pf		= self.__pf,
-						Alarm	= self.__alarm)
+			if Batch != None:
+				Batch.Append(*self.__raw)
+				pd = True
+			else:
+				pd = self.PollData(*[v*s for v,s in zip(self.__raw,SCALE)])
 		return pd
 	
 	def PowerAlarm(self,Value = None):
@@ -301,6 +295,56 @@ class AC_COMBOX:
 				res = self.__thresh
 		return res
 		
+	def Address(self,Value = None):
+		"""
+			reads and/or sets the slave address of the module. After
+			setting, all further commands go to the new address
+			
+		"""
+		res = None
+		if Value == None:
+			if self.__cmd_read_regs(self.__SLAVEADD,self.__FC_R_HOLD,self.__REG_TH,2):
+				res = self.__addr
+		else:
+			if (Value < 1) or (Value > 0xf7):
+				raise ValueError
+			if self.__cmd_write_reg(self.__SLAVEADD,self.__REG_ADDR,Value):
+				self.__SLAVEADD = self.__addr
+				res = self.__addr
+		return res
+		
+	def Probe(self,Addr):
+		"""
+			checks if a module answers at slave address Addr, using the 
+			same holding register read as PowerAlarm(). Returns the 
+			address reported by the module or None. 
+			
+			Probes use a short timeout and print no timeout or dump 
+			messages so that a whole address range can be scanned 
+			quickly, even if other devices answer
+		"""
+		res = None
+		tries = self.__tries
+		quiet = self.__quiet
+		self.__tries = PROBETRIES
+		self.__quiet = True
+		try:
+			self.__ACM.reset_input_buffer()  # drop late replies from earlier probes
+			self.__addr = None
+			if self.__cmd_read_regs(Addr,self.__FC_R_HOLD,self.__REG_TH,2):
+				if self.__addr == Addr:
+					res = self.__addr
+		finally:
+			self.__tries = tries
+			self.__quiet = quiet
+		return res
+	
+	def Close(self):
+		"""
+			closes the serial port
+		"""
+		self.__ACM.close()
+		
 	def ResetEnergy(self):
 		"""
 			resets the energy counter
@@ -310,17 +354,260 @@ class AC_COMBOX:
 		return res
 		
 
-	def __init__(self,ACMport=DEFPORT,ACMspeed=9600):
+	def __init__(self,ACMport=DEFPORT,ACMspeed=9600,Addr=DEFADDR,Exclusive=True):
+		"""
+			with Exclusive the port is locked (POSIX only), so that 
+			Discover() in another process leaves it alone
+		"""
+		self.__SLAVEADD = Addr
 		self.__ACM = serial.Serial(port = ACMport,
 						baudrate=ACMspeed,
-						timeout = 0.01)	
+						timeout = 0.01,
+						exclusive = Exclusive)	
 
 
-if __name__ == "__main__":
-	arg = parser.parse_args()
+class SampleBatch:
+	"""
+		columnar store for the samples of one module. Each column is an
+		array of the raw register integers, the time is kept as 
+		milliseconds since Start. Scaling to V, A, W .. is only done 
+		when values are read back. 
+		
+		A sample takes 27 bytes, against roughly 300 bytes for a 
+		PollData tuple of 7 float objects. A day at one sample every 
+		10s is 233KB per module, or 7.5MB for 32 modules. Samples are
+		expected in time order, Drop() removes old ones so that a batch 
+		can be used as a rolling window.
+	"""
+	
+	# array type codes, in PollData order 
+	__TYPES = ('H','I','I','I','H','H','B')
+	
+	def __init__(self,Start=None):
+		"""
+			Start is the unix time of the batch start, default is now
+		"""
+		if Start == None:
+			Start = time()
+		self.Start = Start
+		self.__time = array('q')
+		self.__cols = [array(t) for t in self.__TYPES]
+	
+	def Append(self,U,I,P,E,F,PF,ALM,Time=None):
+		"""
+			adds one sample of raw values (alarm as 0/1) and returns its 
+			index. Time is the unix time of the sample, default is now
+		"""
+		if Time == None:
+			Time = time()
+		self.__time.append(int(round((Time-self.Start)*1000.0)))
+		for col,v in zip(self.__cols,(U,I,P,E,F,PF,ALM)):
+			col.append(v)
+		return len(self.__time)-1
+	
+	def __len__(self):
+		return len(self.__time)
 	
-	ACM = AC_COMBOX(arg.port_dev)
+	def __getitem__(self,idx):
+		"""
+			returns sample idx as a scaled PollData tuple, or a list of 
+			them if idx is a slice
+		"""
+		if isinstance(idx,slice):
+			return [self[i] for i in range(*idx.indices(len(self)))]
+		return AC_COMBOX.PollData(*[col[idx]*s for col,s in zip(self.__cols,SCALE)])
 	
+	def Drop(self,Before):
+		"""
+			removes all samples older than Before (unix time) and 
+			returns how many were removed
+		"""
+		n = bisect_left(self.__time,int(round((Before-self.Start)*1000.0)))
+		for a in [self.__time]+self.__cols:
+			del a[:n]
+		return n
+	
+	def Time(self,idx):
+		"""
+			returns the unix time of sample idx
+		"""
+		return self.Start + self.__time[idx]*0.001
+	
+	def Raw(self,Name):
+		"""
+			returns the raw array of a column, Name is a PollData field 
+			or 'Time' (milliseconds since Start)
+		"""
+		if Name == 'Time':
+			return self.__time
+		return self.__cols[AC_COMBOX.PollData._fields.index(Name)]
+	
+	def Column(self,Name,NumPy = False):
+		"""
+			returns a column scaled to PollData units, or unix time for 
+			'Time'. With NumPy=True the result is a numpy array made 
+			directly from the raw array buffer, otherwise a list
+		"""
+		raw = self.Raw(Name)
+		if Name == 'Time':
+			scale = 0.001
+			ofs   = self.Start
+		else:
+			scale = SCALE[AC_COMBOX.PollData._fields.index(Name)]
+			ofs   = 0
+		if NumPy:
+			import numpy
+			return numpy.frombuffer(raw,dtype=raw.typecode)*scale + ofs
+		return [v*scale + ofs for v in raw]
+	
+	def nbytes(self):
+		"""
+			returns the memory used by the sample data in bytes
+		"""
+		return sum(a.itemsize*len(a) for a in [self.__time]+self.__cols)
+
+
+Found = namedtuple('Found',['Port','Addr'])
+
+
+def ParseScan(Scan):
+	"""
+		converts an address range string like "1-32" or "1,5,10-12" 
+		into a list of slave addresses
+	"""
+	addrs = []
+	for part in Scan.split(','):
+		lo,_,hi = part.partition('-')
+		lo = int(lo)
+		hi = int(hi) if hi != '' else lo
+		if (lo < 1) or (hi > 247) or (lo > hi):
+			raise ValueError('bad address range: '+part)
+		addrs.extend(range(lo,hi+1))
+	return addrs
+
+
+def ListPorts():
+	"""
+		returns the names of all serial devices that could have a 
+		PZEM module attached
+	"""
+	from serial.tools import list_ports
+	return sorted(p.device for p in list_ports.comports())
+
+
+def _scan_port(port,addrs,speed):
+	"""
+		scans one port for all addresses in addrs. A port that can't be 
+		opened (locked by another process, no permission ..) simply has 
+		no modules 
+	"""
+	found = []
+	try:
+		ACM = AC_COMBOX(port,speed,Exclusive=True)
+	except (serial.SerialException,OSError):
+		return found
+	try:
+		for addr in addrs:
+			if ACM.Probe(addr) != None:
+				found.append(Found(Port=port,Addr=addr))
+	finally:
+		ACM.Close()
+	return found
+
+
+def Discover(Ports=None,Addrs=None,ACMspeed=9600):
+	"""
+		probes all candidate serial ports at the same time (one thread 
+		per port) and returns a list of Found(Port,Addr) tuples for 
+		every PZEM module that answered. 
+		
+		Ports : list of port names, default is all ports from ListPorts()
+		Addrs : list of slave addresses, default is ParseScan(DEFSCAN)
+	"""
+	if Ports == None:
+		Ports = ListPorts()
+	if Addrs == None:
+		Addrs = ParseScan(DEFSCAN)
+	res = []
+	if len(Ports) > 0:
+		from concurrent.futures import ThreadPoolExecutor
+		with ThreadPoolExecutor(max_workers=len(Ports)) as pool:
+			for found in pool.map(lambda p: _scan_port(p,Addrs,ACMspeed),Ports):
+				res.extend(found)
+	return res
+
+
+CSVHEAD = 'Time[S],Volt[V],Current[A],Power[W],Energy[Wh],Freq[Hz],PF, Alarm'
+CSVFMT  = '{:5.1f},{:4.1f},{:7.3f},{:5.1f},{:5.0f},{:3.1f},{:5.2f},{:1n}'
+
+
+def _int_range(lo,hi):
+	"""
+		returns an argparse type that accepts integers from lo to hi
+	"""
+	import argparse
+	def check(s):
+		v = int(s)
+		if (v < lo) or (v > hi):
+			raise argparse.ArgumentTypeError('{:s} is not in {:n}..{:n}'.format(s,lo,hi))
+		return v
+	return check
+
+
+def _make_parser():
+	"""
+		builds the command line parser. This is only done when running 
+		as a script so that importing the module stays cheap
+	"""
+	import argparse
+	parser = argparse.ArgumentParser(
+		description='without a command, logs measurements to a CSV file until ctrl-c')
+	
+	parser.add_argument('--port','-p',help='port (default ='+DEFPORT,
+						dest='port_dev',action='store',type=str,default=DEFPORT)
+	parser.add_argument('--addr',help='slave address (def='+str(DEFADDR)+')',
+						dest='addr',action='store',type=_int_range(1,0xf7),default=DEFADDR)
+	parser.add_argument('--out','-o',help='output filename (default=ACCOM_<timestamp>.csv)',
+						dest='out_name',action='store',type=str,default='!')
+	parser.add_argument('--time','-t',help='interval time in seconds between measurements (def=1.0)',
+						dest='int_time',action='store',type=float,default=1.0)
+	
+						
+	parser.add_argument('--reset','-r',help='reset energy ',
+						dest='reset',action='store_true')
+	parser.add_argument('--alarm','-a',help='set power alarm threshold [W] before logging',
+						dest='alarm',action='store',type=_int_range(0,0x7fff),default=None)
+						
+	parser.add_argument('--debug','-d',help='debug level 0.. (def=1)',
+						dest='debug',action='store',type=int,default=0)
+	
+	cmds = parser.add_subparsers(dest='cmd',metavar='command')
+	
+	cmd = cmds.add_parser('read',help='read the module once and print the values')
+	cmd.add_argument('--format','-f',help='output format (def=json)',
+						dest='fmt',action='store',choices=('json','csv'),default='json')
+	cmd.add_argument('--header',help='print the CSV header line first',
+						dest='header',action='store_true')
+	
+	cmds.add_parser('reset',help='reset the energy counter')
+	
+	cmd = cmds.add_parser('alarm',help='print or set the power alarm threshold')
+	cmd.add_argument('value',help='new threshold [W] 0..32767',nargs='?',type=_int_range(0,0x7fff),default=None)
+	
+	cmd = cmds.add_parser('setaddr',help='change the slave address of the module')
+	cmd.add_argument('value',help='new address 1..247',type=_int_range(1,0xf7))
+	
+	cmd = cmds.add_parser('discover',help='list PZEM modules found on all serial ports')
+	cmd.add_argument('--scan',help='slave address range (def='+DEFSCAN+')',
+						dest='scan',action='store',type=ParseScan,default=DEFSCAN)
+	return parser
+
+
+def _log(ACM,arg):
+	"""
+		the original logging loop: polls the module every int_time seconds
+		and writes the data to a CSV file and the terminal
+	"""
 	if arg.out_name=='!':
 		out_name = 'ACM_'+strftime('%Y%m%d%H%M%S',localtime())+'.csv'
 	else:
@@ -329,27 +616,19 @@ if __name__ == "__main__":
 	if arg.reset:
 		ACM.ResetEnergy()
 	
-	
-	ACM.PowerAlarm(arg.alarm)
+	if arg.alarm != None:
+		ACM.PowerAlarm(arg.alarm)
 	
 	
 	f = open(out_name,'w')
-	f.write('Time[S],Volt[V],Current[A],Power[W],Energy[Wh],Freq[Hz],PF, Alarm\n')
+	f.write(CSVHEAD+'\n')
 	start = perf_counter()
 	now = perf_counter()-start
 	try:			
 		while True:
 			now = perf_counter()-start
 			pd = ACM.Poll()
-			s = '{:5.1f},{:4.1f},{:7.3f},{:5.1f},{:5.0f},{:3.1f},{:5.2f},{:1n}'.format(
-				now,
-				pd.Volt, 
-				pd.Current,
-				pd.Power,
-				pd.Energy,
-				pd.Freq,
-				pd.Pf,
-				pd.Alarm)
+			s = CSVFMT.format(now,*pd)
 			f.write(s+'\n')
 			print(s)
 			elapsed = (perf_counter()-start) - now
@@ -359,5 +638,57 @@ if __name__ == "__main__":
 		f.close()			
 
 
+def _read(ACM,arg):
+	"""
+		one shot read. The time column is the unix time of the reading
+	"""
+	now = time()
+	pd = ACM.Poll()
+	if pd == None:
+		return 1
+	if arg.fmt == 'json':
+		import json
+		vals = [round(v,d) for v,d in zip(pd,DIGITS)]
+		print(json.dumps(dict(Time=round(now,3),**dict(zip(pd._fields,vals)))))
+	else:
+		if arg.header:
+			print(CSVHEAD)
+		print(CSVFMT.format(now,*pd))
+	return 0
 
 
+if __name__ == "__main__":
+	arg = _make_parser().parse_args()
+	
+	if arg.cmd == 'discover':
+		for found in Discover(Addrs=arg.scan):
+			print('{:s} {:n}'.format(found.Port,found.Addr))
+		sys.exit(0)
+	
+	try:
+		ACM = AC_COMBOX(arg.port_dev,Addr=arg.addr)
+	except serial.SerialException as e:
+		print(e,file=sys.stderr)
+		sys.exit(1)
+	
+	if arg.cmd == None:
+		_log(ACM,arg)
+		rc = 0
+	elif arg.cmd == 'read':
+		rc = _read(ACM,arg)
+	else:
+		if arg.cmd == 'reset':
+			res = ACM.ResetEnergy()
+		elif arg.cmd == 'alarm':
+			res = ACM.PowerAlarm(arg.value)
+		elif arg.cmd == 'setaddr':
+			res = ACM.Address(arg.value)
+		if (res is None) or (res is False):
+			rc = 1
+		else:
+			rc = 0
+			if res is not True:
+				print('{:n}'.format(res))
+	if rc != 0:
+		print('no response from '+arg.port_dev+' address '+str(arg.addr),file=sys.stderr)
+	sys.exit(rc)
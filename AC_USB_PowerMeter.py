@@ -26,10 +26,11 @@ import tkinter.scrolledtext as tkst
 import tkinter.filedialog as tkfd
 import tkinter.messagebox as tkmb
 import tkinter.font as tkFont
+import tkinter.ttk as ttk
 from collections import namedtuple
-from AC_COMBOX import AC_COMBOX 
+from AC_COMBOX import AC_COMBOX,DEFADDR,Discover
 from time import localtime,strftime,perf_counter_ns
-import math,argparse
+import math,argparse,threading
 
 class AC_USB_PM_GUI():
 	
@@ -64,21 +65,25 @@ class AC_USB_PM_GUI():
 					  
 		
 		# port stuff in row 0
-		#        (8)           (32)            (8)    = 48
-		#         0              1              2
-		#   0   label  eeeeeeeeeeeeeeeeeeeee  button
+		#        (8)        (24)         (8)      (8)    = 48
+		#         0           1           2        3
+		#   0   label  eeeeeeeeeeeeeee  find  connect
 		#
+		# the port entry takes "port" or "port@address". The find button
+		# fills its drop down list with all modules found by Discover()
 		#
 		self.portframe = tk.Frame(self.window)
 		
 		self.labelPort = tk.Label(self.portframe,width=8, text= 'port:')
-		self.entryPort = tk.Entry(self.portframe, width=32)
+		self.entryPort = ttk.Combobox(self.portframe, width=24)
+		self.buttFind  = tk.Button(self.portframe,width=8,text='Find',bd=5,command=self.DoFind)
 		self.buttConn  = tk.Button(self.portframe,width=8,text='Connect',bd=5,command=self.DoConnect)
 		self.entryPort.bind('<Return>',self.DoConnect)
 		self.entryPort.insert(0,port)
 		self.labelPort.grid(row=0,column=0,sticky='E')
 		self.entryPort.grid(row=0,column=1,sticky='W')
-		self.buttConn.grid(row=0,column=2,sticky='W') 
+		self.buttFind.grid(row=0,column=2,sticky='W') 
+		self.buttConn.grid(row=0,column=3,sticky='W') 
 		self.portframe.grid(row=0,column=0,columnspan=3)
 		
 		
@@ -168,6 +173,8 @@ class AC_USB_PM_GUI():
 		# remaining intitalisation and start of main loop
 		
 		self.Module = None
+		self.FindThread = None
+		self.FindResult = None
 		self.entryPort.focus_set()
 		self.PollCount = 0
 		self.ProgStart = perf_counter_ns()
@@ -176,21 +183,73 @@ class AC_USB_PM_GUI():
 		if self.RecName != '':
 			self.f.close()
 	
+	def DoFind(self,event=None):
+		"""
+			searches all serial ports for modules and offers them in 
+			the port drop down list. The first one found is selected
+
+			The search runs in its own thread so the window stays alive,
+			DoFindDone picks up the result
+		"""
+		if (self.Module == None) and (self.FindThread == None):
+			self.FindResult = None
+			self.FindThread = threading.Thread(target=self.FindWorker,daemon=True)
+			self.window.config(cursor='watch')
+			self.buttFind.config(state='disabled')
+			self.FindThread.start()
+			self.window.after(100,self.DoFindDone)
+	
+	def FindWorker(self):
+		"""
+			runs Discover() in the find thread. Errors are handed over 
+			as the result, tk must only be used from the main thread
+		"""
+		try:
+			self.FindResult = Discover()
+		except Exception as e:
+			self.FindResult = e
+	
+	def DoFindDone(self):
+		"""
+			checks every 0.1s if the find thread has finished and then
+			shows the result
+		"""
+		if self.FindThread.is_alive():
+			self.window.after(100,self.DoFindDone)
+			return
+		self.FindThread = None
+		self.window.config(cursor='')
+		self.buttFind.config(state='normal')
+		found = self.FindResult
+		if isinstance(found,Exception):
+			tkmb.showerror("find error",str(found))
+		elif len(found) == 0:
+			tkmb.showerror("find error","no modules found")
+		else:
+			choices = ['{:s}@{:n}'.format(f.Port,f.Addr) for f in found]
+			self.entryPort.config(values=choices)
+			self.entryPort.set(choices[0])
+	
 	def DoConnect(self,event=None):
 		"""
 			given a port name, the function tries to connect.  
 			As a (crude) test if we connected to a PZEM004T it tries
-			to read a data record. 
+			to read a data record. The port name can be followed by 
+			@ and the slave address, for example /dev/ttyUSB0@2
 			
 			Note that once it connects successfully subsequent connects 
 			only reset the energy data 
 			
 		"""
 		port = self.entryPort.get()
+		if self.FindThread != None:
+			return		# ports are locked by the search
 		if self.Module == None:
 			
 			try:
-				self.Module = AC_COMBOX(port)
+				port,_,addr = port.partition('@')
+				addr = int(addr) if addr != '' else DEFADDR
+				self.Module = AC_COMBOX(port,Addr=addr)
 				self.pd = self.Module.Poll() # try a read 
 				if self.pd == None:
 					self.Module = None
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#MIT License
+#
+#Copyright (c) 2021 TheHWcave
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#
+
+#
+#	fills a temporary archive with a year of synthetic samples for one 
+#	meter and times time range queries on it
+#
+import os
+import math
+import argparse
+import tempfile
+from time import perf_counter,mktime,strptime
+from statistics import median
+from AC_Archive import Archive
+
+YEAR_START = mktime(strptime('2025-01-01','%Y-%m-%d'))
+
+
+def fill(ARC,interval):
+	"""
+		one year of samples every interval seconds, with a daily load cycle
+	"""
+	energy = 0.0
+	for n in range(int(365*86400/interval)):
+		t = YEAR_START + n*interval
+		power = 500.0 + 400.0*math.sin(t*2*math.pi/86400) + (n % 7)
+		energy += power*interval/3600.0
+		ARC.Append('bench',t,230.0+(n % 13)*0.1,power/230.0,power,energy,50.0,0.95,0)
+	ARC.Flush()
+	return n+1
+
+
+def run(ARC,start,length,runs):
+	"""
+		returns the query times in ms and the number of samples returned
+	"""
+	times = []
+	for r in range(runs):
+		t = perf_counter()
+		res = ARC.Query('bench',start,start+length)
+		times.append((perf_counter()-t)*1000.0)
+	return times,len(res)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--interval','-i',help='seconds between samples (def=10)',
+						dest='interval',action='store',type=float,default=10.0)
+	parser.add_argument('--runs','-n',help='runs per query (def=20)',
+						dest='runs',action='store',type=int,default=20)
+	arg = parser.parse_args()
+	
+	with tempfile.TemporaryDirectory() as path:
+		ARC = Archive(path)
+		t = perf_counter()
+		n = fill(ARC,arg.interval)
+		size = sum(os.path.getsize(os.path.join(path,fn)) for fn in os.listdir(path))
+		print('{:n} samples written in {:.1f}s, {:.1f} bytes/sample'.format(
+			n,perf_counter()-t,size/n))
+		
+		# a fresh Archive has to load the index first
+		t = perf_counter()
+		Archive(path).Query('bench',YEAR_START,YEAR_START+1)
+		print('first query incl. index load: {:.1f}ms'.format((perf_counter()-t)*1000.0))
+		
+		print('{:12s} {:>8s} {:>8s} {:>8s}'.format('range','samples','min[ms]','med[ms]'))
+		for name,length in (('1 hour',3600),('1 day',86400),('1 week',7*86400)):
+			times,cnt = run(ARC,YEAR_START+200*86400+14*3600,length,arg.runs)
+			print('{:12s} {:8n} {:8.2f} {:8.2f}'.format(name,cnt,min(times),median(times)))
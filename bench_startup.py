@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#MIT License
+#
+#Copyright (c) 2021 TheHWcave
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#
+
+#
+#	measures how long a fresh python process needs to get ready for work
+#	with AC_COMBOX: the bare interpreter, importing the module, and 
+#	running the CLI up to the point where it would open the port. 
+#	No module needs to be attached. 
+#
+import subprocess
+import sys
+import os
+import argparse
+from time import perf_counter
+from statistics import median
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CASES = (('python -c pass'			,[sys.executable,'-c','pass']),
+		 ('import AC_COMBOX'		,[sys.executable,'-c','import AC_COMBOX']),
+		 ('AC_COMBOX.py --help'		,[sys.executable,os.path.join(HERE,'AC_COMBOX.py'),'--help']),
+		 ('AC_COMBOX.py read --help',[sys.executable,os.path.join(HERE,'AC_COMBOX.py'),'read','--help']))
+
+
+def run(cmd,runs):
+	"""
+		runs cmd runs times and returns a list of wall clock times in ms
+	"""
+	times = []
+	for n in range(runs):
+		start = perf_counter()
+		subprocess.run(cmd,cwd=HERE,stdout=subprocess.DEVNULL,check=True)
+		times.append((perf_counter()-start)*1000.0)
+	return times
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--runs','-n',help='runs per case (def=20)',
+						dest='runs',action='store',type=int,default=20)
+	arg = parser.parse_args()
+	
+	print('{:28s} {:>8s} {:>8s}'.format('case','min[ms]','med[ms]'))
+	for name,cmd in CASES:
+		times = run(cmd,arg.runs)
+		print('{:28s} {:8.1f} {:8.1f}'.format(name,min(times),median(times)))